@@ -1,19 +1,66 @@
 import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING  # gzip, deflate (+ br when brotli is installed)
+from urllib3.util.retry import Retry
 import urllib.parse
-import json
-from flask import Flask, request, jsonify
-from concurrent.futures import ThreadPoolExecutor
+import orjson
+from flask import Flask, Response, request, jsonify, stream_with_context
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+import hashlib
+import threading
+from cachetools import TTLCache
 import logging # Added for better logging
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from jiomart import search_jiomart_products
+from normalize import normalize_dmart_sku
 
 # --- Configuration & Constants ---
 DMART_BASE_URL = "https://www.dmart.in"
-DMART_IMAGE_BASE = "https://images.dmart.in/images/rwd/products/" # Needs verification
 NINE_MINUTES_API_URL = "https://9minutes.in/api/fetch_products"
 REQUEST_TIMEOUT = 20 # Increased timeout slightly for external aggregator
+# Hard cap (seconds) on one /search_all fan-out. Budgeted for the slowest path, JioMart,
+# which makes two sequential calls (pincode mapping, then Algolia) of up to REQUEST_TIMEOUT each.
+# Kept under gunicorn's 60s worker timeout; overruns are reported as failures and never cached.
+SEARCH_DEADLINE = 2 * REQUEST_TIMEOUT + 2
+
+# Recently served /search_all bodies as (etag, body), keyed by (normalized query, pincode)
+RESPONSE_CACHE = TTLCache(maxsize=2048, ttl=60)
+_RESPONSE_CACHE_LOCK = threading.RLock()
+
+# Static request headers, shared by every call (requests merges them into a per-request copy)
+_DMART_HEADERS = {
+    'Accept-Encoding': DEFAULT_ACCEPT_ENCODING,
+    'Origin': 'https://www.dmart.in',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'
+}
+_9M_HEADERS = {
+    'Accept': '*/*',
+    'Accept-Encoding': DEFAULT_ACCEPT_ENCODING,
+    'Connection': 'keep-alive',
+    'Referer': 'https://9minutes.in/', # Important based on curl example
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36' # Good practice
+}
+
+# Shared session so concurrent platform searches reuse pooled keep-alive connections
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32,
+                       max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504]))
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
 
 # Setup basic logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Worker threads only enqueue records; a single listener thread formats and writes them
+_log_queue = queue.SimpleQueue()
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+_log_listener = QueueListener(_log_queue, _stream_handler, respect_handler_level=True)
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s')) # Only merge args; the listener adds the prefix
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
 # --- Location Mapping (VERY BASIC - NEEDS PROPER IMPLEMENTATION) ---
 def get_9minutes_location_string(pincode):
@@ -29,13 +76,13 @@ def get_9minutes_location_string(pincode):
     # elif pincode == "400076":
     #     return "400076_powai_mum" # Example hypothetical format
     else:
-        logging.warning(f"No location mapping available for pincode {pincode} for 9minutes.in API.")
+        logging.warning("No location mapping available for pincode %s for 9minutes.in API.", pincode)
         # Fallback or error? Let's return None to indicate failure.
         return None
 
 # --- DMart Specific Functions (Keep as before) ---
 def get_dmart_store_id(pincode):
-    logging.info(f"[DMart] Attempting to find store ID for pincode: {pincode}")
+    logging.info("[DMart] Attempting to find store ID for pincode: %s", pincode)
     if pincode == "500049" or pincode == "500032":
          logging.info("[DMart] Using hardcoded store ID 10733 for pincode 500032 (DEMO ONLY)")
          return "10733"
@@ -43,12 +90,13 @@ def get_dmart_store_id(pincode):
          logging.info("[DMart] Using hardcoded store ID 10011 for pincode 400076 (DEMO ONLY)")
          return "10011"
     else:
-         logging.warning(f"[DMart] No mapping found for pincode {pincode} in demo.")
+         logging.warning("[DMart] No mapping found for pincode %s in demo.", pincode)
          return None
 
 def search_dmart_products(query, pincode):
     """
     Searches DMart and normalizes the response, using the CORRECTED image URL structure.
+    A pincode without a store yields an empty list; API failures are logged and re-raised.
     """
     dmart_results = []
     store_id = get_dmart_store_id(pincode)
@@ -58,80 +106,40 @@ def search_dmart_products(query, pincode):
 
     encoded_query = urllib.parse.quote(query)
     search_url = f"https://digital.dmart.in/api/v3/search/{encoded_query}?storeId={store_id}"
-    search_headers = {
-        'Origin': 'https://www.dmart.in',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'
-    }
-    logging.info(f"[DMart] Calling Search API: {search_url}")
+    logging.info("[DMart] Calling Search API: %s", search_url)
     try:
-        response = requests.get(search_url, headers=search_headers, timeout=REQUEST_TIMEOUT)
+        response = SESSION.get(search_url, headers=_DMART_HEADERS, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
 
         raw_product_list = data.get("products", [])
-        logging.info(f"[DMart] Received response. Found {len(raw_product_list)} product entries.")
+        logging.info("[DMart] Received response. Found %d product entries.", len(raw_product_list))
 
+        append = dmart_results.append # Bound once for the SKU loop
         for product_item in raw_product_list:
             parent_name = product_item.get("name")
+            if not parent_name:
+                continue # Every SKU of this product would be dropped anyway
             target_url_path = product_item.get("targetUrl")
-            full_product_url = f"{DMART_BASE_URL}{target_url_path}" if target_url_path else None
-
-            skus = product_item.get("sKUs", [])
-            for sku_item in skus:
-                try:
-                    if sku_item.get("buyable") != "true" or sku_item.get("invType") == "OOS":
-                        continue # Skip non-buyable or OOS items
-
-                    mrp_str = sku_item.get("priceMRP")
-                    selling_price_str = sku_item.get("priceSALE")
-                    variant = sku_item.get("variantTextValue")
-                    # --- Corrected Image URL Logic ---
-                    product_image_key = sku_item.get("productImageKey")
-                    img_code = sku_item.get("imgCode")
-                    image_url = None # Default to None
-                    if product_image_key and img_code:
-                        image_url = f"https://cdn.dmart.in/images/products/{product_image_key}_{img_code}_P.jpg"
-                    else:
-                        # Fallback or log warning if key components are missing
-                        image_key_fallback = sku_item.get("imageKey") # Check fallback
-                        if image_key_fallback and img_code:
-                             image_url = f"https://cdn.dmart.in/images/products/{image_key_fallback}_{img_code}_P.jpg"
-                             logging.debug(f"[DMart] Used fallback imageKey for SKU {sku_item.get('skuUniqueID')}")
-                        else:
-                            logging.warning(f"[DMart] Missing productImageKey or imgCode for SKU {sku_item.get('skuUniqueID')}. Cannot construct image URL.")
-                    # --- End Corrected Image URL Logic ---
-
-                    barcode = sku_item.get("articleNumber") # Use articleNumber as potential barcode/EAN
-
-                    if parent_name and mrp_str and selling_price_str:
-                        # Normalize data to target structure
-                        normalized_product = {
-                            "name": parent_name,
-                            "mrp": float(mrp_str) if mrp_str else None,
-                            "selling_price": float(selling_price_str) if selling_price_str else None,
-                            "image": image_url, # Use the constructed URL
-                            "variant": variant,
-                            "barcode": barcode or "", # Ensure string, default empty
-                            "deeplink": full_product_url or "" # Ensure string, default empty
-                        }
-                        dmart_results.append(normalized_product)
-
-                except (ValueError, TypeError) as e:
-                    logging.error(f"[DMart] Error converting price for SKU {sku_item.get('skuUniqueID')}: {e}")
-                    continue
-                except Exception as e:
-                    logging.error(f"[DMart] Error parsing one SKU item: {e} - SKU: {sku_item}")
-                    continue
-
-        logging.info(f"[DMart] Successfully normalized {len(dmart_results)} SKUs.")
+            full_product_url = f"{DMART_BASE_URL}{target_url_path}" if target_url_path else ""
+
+            for sku_item in product_item.get("sKUs", ()):
+                normalized_product = normalize_dmart_sku(sku_item, parent_name, full_product_url)
+                if normalized_product is not None:
+                    append(normalized_product)
+
+        logging.info("[DMart] Successfully normalized %d SKUs.", len(dmart_results))
 
     # Basic exception handling for the request
     except requests.exceptions.RequestException as e:
-        logging.error(f"[DMart] API call failed: {e}")
-    except json.JSONDecodeError:
+        logging.error("[DMart] API call failed: %s", e)
+        raise
+    except orjson.JSONDecodeError:
         logging.error("[DMart] Failed to decode JSON response.")
+        raise
     except Exception as e:
-         logging.error(f"[DMart] An unexpected error occurred: {e}")
+         logging.error("[DMart] An unexpected error occurred: %s", e)
+         raise
 
     return dmart_results
 
@@ -140,88 +148,167 @@ def search_dmart_products(query, pincode):
 def call_9minutes_api(query, pincode):
     """
     Helper function to call the 9minutes.in API.
-    Returns the parsed JSON response or None on failure.
+    Returns the parsed JSON response, or None if the pincode has no location mapping.
+    API failures are logged and re-raised, so they are not mistaken for an empty answer.
     """
     location_string = get_9minutes_location_string(pincode)
     if not location_string:
-        logging.error(f"[9minutes Helper] Cannot proceed without location string for pincode {pincode}.")
+        logging.error("[9minutes Helper] Cannot proceed without location string for pincode %s.", pincode)
         return None # Cannot proceed without valid location mapping
 
     encoded_query = urllib.parse.quote(query)
     api_url = f"{NINE_MINUTES_API_URL}?query={encoded_query}&location={location_string}"
 
-    headers = {
-        'Accept': '*/*',
-        'Connection': 'keep-alive',
-        'Referer': 'https://9minutes.in/', # Important based on curl example
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36' # Good practice
-    }
-
-    logging.info(f"[9minutes Helper] Calling API: {api_url}")
+    logging.info("[9minutes Helper] Calling API: %s", api_url)
     try:
-        response = requests.get(api_url, headers=headers, timeout=REQUEST_TIMEOUT)
+        response = SESSION.get(api_url, headers=_9M_HEADERS, timeout=REQUEST_TIMEOUT)
         response.raise_for_status() # Check for HTTP errors
-        data = response.json()
-        logging.info(f"[9minutes Helper] Successfully received data.")
+        data = orjson.loads(response.content)
+        logging.info("[9minutes Helper] Successfully received data.")
         return data
     except requests.exceptions.RequestException as e:
-        logging.error(f"[9minutes Helper] API call failed: {e}")
-        return None
-    except json.JSONDecodeError:
+        logging.error("[9minutes Helper] API call failed: %s", e)
+        raise
+    except orjson.JSONDecodeError:
         logging.error("[9minutes Helper] Failed to decode JSON response.")
-        return None
+        raise
     except Exception as e:
-        logging.error(f"[9minutes Helper] An unexpected error occurred: {e}")
-        return None
-
-def search_instamart_products(query, pincode):
-    """Gets Instamart products by calling the 9minutes.in API."""
-    logging.info(f"[Instamart] Getting data via 9minutes.in API for query='{query}', pincode='{pincode}'")
-    data = call_9minutes_api(query, pincode)
-    if data and isinstance(data.get("instamart_products"), list):
+        logging.error("[9minutes Helper] An unexpected error occurred: %s", e)
+        raise
+
+def _normalize_9m_items(items):
+    """Coerces mrp/selling_price of 9minutes.in products to floats in place."""
+    _float = float # Local alias for the per-item conversions
+    for item in items:
+        get = item.get
+        mrp = get('mrp')
+        selling_price = get('selling_price')
+        item['mrp'] = _float(mrp) if mrp is not None else None
+        item['selling_price'] = _float(selling_price) if selling_price is not None else None
+    return items
+
+def extract_9minutes_products(data, key, platform):
+    """
+    Picks one platform's product list (e.g. 'zepto_products') out of an
+    already fetched 9minutes.in response, so a single API call can serve
+    Instamart, Zepto and Blinkit.
+    """
+    if data and isinstance(data.get(key), list):
          # Data is already normalized by 9minutes.in, just return the list
-         results = data["instamart_products"]
-         logging.info(f"[Instamart] Extracted {len(results)} products via 9minutes.in.")
-         # Optional: Add type conversion safety if needed
-         for item in results:
-             item['mrp'] = float(item['mrp']) if item.get('mrp') is not None else None
-             item['selling_price'] = float(item['selling_price']) if item.get('selling_price') is not None else None
+         try:
+             results = _normalize_9m_items(data[key])
+         except (ValueError, TypeError) as e:
+             logging.error("[%s] Error converting prices from 9minutes.in response: %s", platform, e)
+             return []
+         logging.info("[%s] Extracted %d products via 9minutes.in.", platform, len(results))
          return results
     else:
-        logging.warning("[Instamart] Failed to get valid Instamart data from 9minutes.in response.")
+        logging.warning("[%s] Failed to get valid %s data from 9minutes.in response.", platform, platform)
         return []
 
-def search_zepto_products(query, pincode):
-    """Gets Zepto products by calling the 9minutes.in API."""
-    logging.info(f"[Zepto] Getting data via 9minutes.in API for query='{query}', pincode='{pincode}'")
+# Response keys served by the single 9minutes.in call, with their log labels
+NINE_MINUTES_PLATFORMS = (
+    ("instamart_products", "Instamart"),
+    ("zepto_products", "Zepto"),
+    ("blinkit_products", "Blinkit"),
+)
+
+# Keys of the combined /search_all response, in output order
+RESPONSE_KEYS = (
+    "instamart_products", "zepto_products", "blinkit_products",
+    "dmart_products", "jiomart_products",
+)
+
+def search_9minutes_platforms(query, pincode):
+    """Calls 9minutes.in once and splits the response into the Instamart, Zepto and Blinkit lists."""
     data = call_9minutes_api(query, pincode)
-    if data and isinstance(data.get("zepto_products"), list):
-         results = data["zepto_products"]
-         logging.info(f"[Zepto] Extracted {len(results)} products via 9minutes.in.")
-         # Optional: Add type conversion safety if needed
-         for item in results:
-             item['mrp'] = float(item['mrp']) if item.get('mrp') is not None else None
-             item['selling_price'] = float(item['selling_price']) if item.get('selling_price') is not None else None
-         return results
-    else:
-        logging.warning("[Zepto] Failed to get valid Zepto data from 9minutes.in response.")
-        return []
+    return {key: extract_9minutes_products(data, key, platform) for key, platform in NINE_MINUTES_PLATFORMS}
 
-def search_blinkit_products(query, pincode):
-    """Gets Blinkit products by calling the 9minutes.in API."""
-    logging.info(f"[Blinkit] Getting data via 9minutes.in API for query='{query}', pincode='{pincode}'")
-    data = call_9minutes_api(query, pincode)
-    if data and isinstance(data.get("blinkit_products"), list):
-         results = data["blinkit_products"]
-         logging.info(f"[Blinkit] Extracted {len(results)} products via 9minutes.in.")
-         # Optional: Add type conversion safety if needed
-         for item in results:
-             item['mrp'] = float(item['mrp']) if item.get('mrp') is not None else None
-             item['selling_price'] = float(item['selling_price']) if item.get('selling_price') is not None else None
-         return results
-    else:
-        logging.warning("[Blinkit] Failed to get valid Blinkit data from 9minutes.in response.")
-        return []
+def _submit_platform_searches(executor, query, pincode):
+    """
+    Submits one task per upstream API. Returns a dict mapping each future
+    to (label, response keys); every future resolves to {key: products}.
+    """
+    nine_minutes_pincode = "500032" if pincode == "500049" else pincode
+    return {
+        executor.submit(search_9minutes_platforms, query, nine_minutes_pincode):
+            ("9minutes.in", [key for key, _ in NINE_MINUTES_PLATFORMS]),
+        executor.submit(lambda: {"dmart_products": search_dmart_products(query, pincode)}):
+            ("DMart", ["dmart_products"]),
+        executor.submit(lambda: {"jiomart_products": search_jiomart_products(query, pincode)}):
+            ("JioMart", ["jiomart_products"]),
+    }
+
+def _platform_results(future, label, keys):
+    """
+    Returns (a finished future's {key: products}, True), or empty lists
+    for its keys and False if it raised.
+    """
+    try:
+        return future.result(), True
+    except Exception as e:
+        logging.error("Exception retrieving %s results: %s", label, e)
+        return {key: [] for key in keys}, False
+
+def _iter_platform_results(futures):
+    """
+    Yields (response key, products, ok) triples in completion order. Searches
+    that raised, or were still running after SEARCH_DEADLINE seconds, yield
+    empty lists with ok=False so the partial response is not cached.
+    """
+    pending = dict(futures)
+    try:
+        for future in as_completed(futures, timeout=SEARCH_DEADLINE):
+            label, keys = pending.pop(future)
+            results, ok = _platform_results(future, label, keys)
+            for key, products in results.items():
+                yield key, products, ok
+    except FuturesTimeoutError:
+        for label, keys in pending.values():
+            logging.error("%s search did not finish within %ss.", label, SEARCH_DEADLINE)
+            for key in keys:
+                yield key, [], False
+
+def _response_cache_key(query, pincode):
+    return (query.strip().lower(), pincode)
+
+def _cache_response(cache_key, body):
+    """Stores a serialized /search_all body in RESPONSE_CACHE and returns its ETag."""
+    etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+    with _RESPONSE_CACHE_LOCK:
+        RESPONSE_CACHE[cache_key] = (etag, body)
+    return etag
+
+def _stream_search_results(query, pincode, cache_key):
+    """
+    Yields the /search_all JSON object piece by piece, writing each
+    platform's list as soon as its upstream search completes. The full
+    body is cached afterwards if every platform answered and at least one
+    returned products.
+    """
+    executor = ThreadPoolExecutor(max_workers=3)
+    chunks = []
+    found_products = False
+    complete = True
+    try:
+        futures = _submit_platform_searches(executor, query, pincode)
+        separator = b"{"
+        for key, products, ok in _iter_platform_results(futures):
+            chunk = separator + orjson.dumps(key) + b":" + orjson.dumps(products)
+            chunks.append(chunk)
+            yield chunk
+            separator = b","
+            found_products = found_products or bool(products)
+            complete = complete and ok
+            logging.info("Streamed %d %s.", len(products), key)
+        chunks.append(b"}")
+        yield b"}"
+    finally:
+        # Don't hold the response open for searches that overran the deadline
+        executor.shutdown(wait=False, cancel_futures=True)
+    if found_products and complete:
+        _cache_response(cache_key, b"".join(chunks))
+    logging.info("--- Request End (streamed) ---")
 
 
 # --- Flask API Setup ---
@@ -232,6 +319,14 @@ def search_all_platforms():
     """
     API endpoint to search across all integrated platforms concurrently.
     Accepts 'query' and 'pincode' as URL parameters.
+    The response is streamed as each platform finishes; pass 'stream=0'
+    to receive it in one piece once every search has completed.
+
+    Complete answers are cached for 60s and served with an ETag, and a
+    matching If-None-Match gets a 304. On a cache miss only the 'stream=0'
+    response carries an ETag, because a streamed response's headers go out
+    before its body exists. Streamed clients get an ETag, and can
+    revalidate, from the first cache hit onwards.
     """
     query = request.args.get('query')
     pincode = request.args.get('pincode')
@@ -242,68 +337,54 @@ def search_all_platforms():
     if not pincode.isdigit() or len(pincode) != 6:
          return jsonify({"error": "Pincode must be 6 digits"}), 400
 
-    logging.info(f"\n--- New Request Start ---")
-    logging.info(f"Received request: query='{query}', pincode='{pincode}'")
+    logging.info("\n--- New Request Start ---")
+    logging.info("Received request: query='%s', pincode='%s'", query, pincode)
 
-    results = {} # Store results temporarily
+    # Serve repeated searches from the response cache, answering 304 if the client's ETag matches
+    cache_key = _response_cache_key(query, pincode)
+    with _RESPONSE_CACHE_LOCK:
+        cached = RESPONSE_CACHE.get(cache_key)
+    if cached is not None:
+        etag, body = cached
+        logging.info("Serving cached response (ETag %s).", etag)
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        return response.make_conditional(request)
 
-    # Use ThreadPoolExecutor to run searches concurrently
-    # One worker per platform function
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        logging.info("Submitting tasks to executor...")
-        # Submit tasks: DMart direct, others via 9minutes helper
-        future_instamart = executor.submit(search_instamart_products, query, "500032" if pincode == "500049" else pincode)
-        future_zepto = executor.submit(search_zepto_products, query, "500032" if pincode == "500049" else pincode)
-        future_blinkit = executor.submit(search_blinkit_products, query, "500032" if pincode == "500049" else pincode)
-        future_dmart = executor.submit(search_dmart_products, query, pincode)
-        future_jiomart = executor.submit(search_jiomart_products, query, pincode)
-        logging.info("Tasks submitted.")
-
-        # Wait for completion and retrieve results safely
-        logging.info("Waiting for results...")
-        try:
-            results["instamart_products"] = future_instamart.result()
-        except Exception as e:
-            logging.error(f"Exception retrieving Instamart results: {e}")
-            results["instamart_products"] = [] # Ensure key exists
-
-        try:
-            results["zepto_products"] = future_zepto.result()
-        except Exception as e:
-            logging.error(f"Exception retrieving Zepto results: {e}")
-            results["zepto_products"] = []
-
-        try:
-            results["blinkit_products"] = future_blinkit.result()
-        except Exception as e:
-            logging.error(f"Exception retrieving Blinkit results: {e}")
-            results["blinkit_products"] = []
-
-        try:
-            results["dmart_products"] = future_dmart.result()
-        except Exception as e:
-            logging.error(f"Exception retrieving DMart results: {e}")
-            results["dmart_products"] = []
-            
-        try: results["jiomart_products"] = future_jiomart.result()
-        except Exception as e: logging.error(f"Exception retrieving JioMart results: {e}"); results["jiomart_products"] = []
+    if request.args.get('stream') != '0':
+        return Response(stream_with_context(_stream_search_results(query, pincode, cache_key)), mimetype='application/json')
 
+    # Use ThreadPoolExecutor to run searches concurrently
+    # One worker per upstream API (9minutes.in serves Instamart, Zepto and Blinkit)
+    executor = ThreadPoolExecutor(max_workers=3)
+    try:
+        futures = _submit_platform_searches(executor, query, pincode)
+        logging.info("Tasks submitted. Waiting for results...")
+        results = {}
+        complete = True
+        for key, products, ok in _iter_platform_results(futures):
+            results[key] = products
+            complete = complete and ok
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
     logging.info("All searches completed or timed out.")
 
     # Ensure the final response has the correct keys, even if lists are empty
-    final_response = {
-        "instamart_products": results.get("instamart_products", []),
-        "zepto_products": results.get("zepto_products", []),
-        "blinkit_products": results.get("blinkit_products", []),
-        "dmart_products": results.get("dmart_products", []),
-        "jiomart_products": results.get("jiomart_products", [])
-    }
-
-    logging.info(f"Returning combined results. Instamart: {len(final_response['instamart_products'])}, Zepto: {len(final_response['zepto_products'])}, Blinkit: {len(final_response['blinkit_products'])}, DMart: {len(final_response['dmart_products'])}")
-    logging.info(f"--- Request End ---")
-
-    return jsonify(final_response)
+    final_response = {key: results.get(key, []) for key in RESPONSE_KEYS}
+
+    logging.info("Returning combined results. Instamart: %d, Zepto: %d, Blinkit: %d, DMart: %d, JioMart: %d",
+                 len(final_response['instamart_products']), len(final_response['zepto_products']),
+                 len(final_response['blinkit_products']), len(final_response['dmart_products']),
+                 len(final_response['jiomart_products']))
+    logging.info("--- Request End ---")
+
+    body = orjson.dumps(final_response)
+    response = app.response_class(body, mimetype='application/json')
+    if complete and any(final_response.values()):
+        # Only cache full answers, so failed or timed-out platforms are retried
+        response.set_etag(_cache_response(cache_key, body))
+    return response
 @app.after_request
 def add_cors_headers(response):
     response.headers["Access-Control-Allow-Origin"] = "*"
@@ -314,5 +395,6 @@ if __name__ == '__main__':
     print("WARNING: This API relies on unofficial methods and external services (9minutes.in, DMart APIs).")
     print("WARNING: Pincode-to-location mapping is currently hardcoded for specific examples.")
     print("Listening on http://0.0.0.0:5001/")
+    print("NOTE: This is the development server. In production run: gunicorn aggregator_api:app")
     # Use host='0.0.0.0' to make it accessible on your network
-    app.run(host='0.0.0.0', port=5001, debug=False) # Set debug=False for cleaner production logs
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5001, debug=False, threaded=True) # Set debug=False for cleaner production logs
\ No newline at end of file
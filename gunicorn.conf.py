@@ -0,0 +1,12 @@
+# Gunicorn settings for serving the aggregator in production.
+# Usage: gunicorn aggregator_api:app
+import multiprocessing
+
+bind = "0.0.0.0:5001"
+# Threaded workers: each /search_all spends almost all of its time waiting on upstream I/O
+worker_class = "gthread"
+workers = multiprocessing.cpu_count() + 1
+threads = 16
+# Upstream calls can take up to REQUEST_TIMEOUT (20s) plus retries
+timeout = 60
+keepalive = 5
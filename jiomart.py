@@ -1,283 +1,513 @@
 import requests
-import json
+import httpx
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING  # gzip, deflate (+ br when brotli is installed)
+from urllib3.util.retry import Retry
+import orjson
+import os
 import urllib.parse
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+from itertools import chain
+from cachetools import TTLCache
 # --- Configuration & Constants ---
-DMART_BASE_URL = "https://www.dmart.in"
-# Base URL for DMart images
-DMART_IMAGE_BASE = "https://cdn.dmart.in/images/products/"
-NINE_MINUTES_API_URL = "https://9minutes.in/api/fetch_products"
 # Timeout for external API calls in seconds (e.g., 20 seconds) <--- ADD THIS LINE
 REQUEST_TIMEOUT = 20
+# Set JIOMART_DUMP_RESPONSE=1 to save each raw Algolia response to algolia_response.json
+DUMP_RESPONSES = bool(os.environ.get("JIOMART_DUMP_RESPONSE"))
+
+# Headers common to the mapping and Algolia calls
+_BROWSER_HEADERS = {
+    'Referer': 'https://www.jiomart.com/',
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
+}
+
+# Shared session so mapping calls reuse pooled keep-alive connections
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=16, pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504])))
+SESSION.headers.update({'Accept-Encoding': DEFAULT_ACCEPT_ENCODING, **_BROWSER_HEADERS})
+
+JIOMART_BASE_URL = "https://www.jiomart.com"
+JIOMART_MAPPING_URL = JIOMART_BASE_URL + "/collection/mcat_pincode/get_mcat_inventory_code/"
+_JIOMART_IMAGE_URL = JIOMART_BASE_URL + "/images/product/original/%s?im=Resize=(150,150)"
+
+ALGOLIA_APP_ID = "3YP0HP3WSH"
+ALGOLIA_API_KEY = "aace3f18430a49e185d2c1111602e4b1"
+ALGOLIA_URL = f"https://{ALGOLIA_APP_ID}-dsn.algolia.net/1/indexes/*/queries"
+ALGOLIA_INDEX_NAME = "prod_mart_master_vertical"
+
+# Algolia fields to retrieve, serialized once for the request params
+ALGOLIA_ATTRIBUTES = [  # Request fields based on sample response and previous findings
+    "product_code", "display_name", "brand", "category_level.level4",
+    "buybox_mrp", "vertical_code", "image_path", "url_path", "objectID"
+    # Note: variant_text/weight_string seem missing from actual data, even if requested
+]
+_ATTRS_JSON = orjson.dumps(ALGOLIA_ATTRIBUTES).decode()
+_quote = urllib.parse.quote_plus
+# Algolia search params that never change, urlencoded once
+_STATIC_PARAMS_ENC = urllib.parse.urlencode({
+    "page": 0, "hitsPerPage": 20,
+    "attributesToRetrieve": _ATTRS_JSON,
+    "attributesToHighlight": '[]', "clickAnalytics": "false",
+    "userToken": "backend-aggregator-user-004"
+})
+# Filter clauses that are the same for every pincode. The per-pincode OR groups go
+# in facetFilters (OR within an inner list, AND across lists); only the NOT clauses
+# need the filters DSL.
+_MART_AVAILABILITY_FACETS = ("mart_availability:JIO", "mart_availability:JIO_WA")
+_EXCLUSIONS = "(NOT vertical_code:ALCOHOL) AND (NOT vertical_code:LOCALSHOPS)"
+_EXCLUSIONS_ENC = _quote(_EXCLUSIONS)
+
+# Per-endpoint request headers, merged over the shared client headers
+_JIOMART_MAPPING_HEADERS = {
+    'accept': 'application/json, text/javascript, */*; q=0.01',
+    'accept-language': 'en-GB,en;q=0.9',
+    'cache-control': 'no-cache',
+    'pragma': 'no-cache',
+    'priority': 'u=0, i',  # Keep priority header if observed
+    'sec-fetch-dest': 'empty',
+    'sec-fetch-mode': 'cors',
+    'sec-fetch-site': 'same-origin',
+    'sec-gpc': '1',
+    'x-requested-with': 'XMLHttpRequest'
+    # NOTE: Cookies are omitted initially. Add if required based on testing.
+}
+_ALGOLIA_HEADERS = {
+    'Accept': 'application/json', 'Content-Type': 'application/json',
+    'x-algolia-application-id': ALGOLIA_APP_ID, 'x-algolia-api-key': ALGOLIA_API_KEY,
+    'Origin': 'https://www.jiomart.com'
+}
+
+# Algolia is called over HTTP/2, so concurrent searches from every worker thread
+# multiplex over one connection. httpx.Client is synchronous and thread-safe.
+# Like urllib3's Retry for POSTs, the transport retries connection failures only.
+ALGOLIA_CLIENT = httpx.Client(
+    headers={**_BROWSER_HEADERS, **_ALGOLIA_HEADERS},
+    timeout=REQUEST_TIMEOUT,
+    transport=httpx.HTTPTransport(
+        http2=True, retries=2,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=60)))
+
+# Pincode -> store/region codes rarely changes, so successful lookups are cached for an hour.
+# Pincodes the mapping API reports as unknown (404) are remembered for 5 minutes.
+INVENTORY_CODES_CACHE = TTLCache(maxsize=4096, ttl=3600)
+UNSERVICEABLE_PINCODES_CACHE = TTLCache(maxsize=4096, ttl=300)
+_INVENTORY_CODES_LOCK = threading.Lock()
+_NOT_SERVICEABLE = object()  # Returned by the fetch helper for a 404
+_EMPTY = {}  # Shared read-only stand-in for a missing buybox_mrp
+
+# Pincode -> (inventory codes it was built from, (analytics params, filter params, store codes)).
+# An entry is only used while INVENTORY_CODES_CACHE still holds that same inventory object,
+# so both expire together; the TTL here just bounds memory.
+FILTERS_CACHE = TTLCache(maxsize=4096, ttl=3600)
+# (region codes, store codes) -> (encoded filter params, store codes). Pincodes served by
+# the same stores hold references to this one string rather than their own copies.
+FACET_FILTERS_CACHE = TTLCache(maxsize=4096, ttl=3600)
+_FILTERS_LOCK = threading.Lock()
 
 # Setup basic logging
 # ... (rest of the logging setup) ...
-# Add this helper function somewhere before search_jiomart_products
-
-
-def build_algolia_or_filter(key_name, values):
-    """Helper to build Algolia filter strings like (key:v1 OR key:v2)."""
-    if not values:
-        return ""
-    # Ensure unique values
-    unique_values = set(values)
-    # Format: key:value
-    clauses = [f"{key_name}:{value}" for value in unique_values]
-    return f"({' OR '.join(clauses)})"
 
 # --- Function to get JioMart Location Codes ---
 
 
-def get_jiomart_inventory_codes(pincode):
+def _fetch_jiomart_inventory_codes(pincode):
     """
     Calls the JioMart API to get store/region codes for a pincode.
-    Returns the parsed JSON data or None on failure.
+    Returns the parsed JSON data, _NOT_SERVICEABLE for a 404, or None for
+    an unexpected payload. Transport, HTTP and decode errors are logged and
+    re-raised, so callers can tell an outage from an unmapped pincode.
     """
-    mapping_url = f"https://www.jiomart.com/collection/mcat_pincode/get_mcat_inventory_code/{pincode}"
-    headers = {
-        'accept': 'application/json, text/javascript, */*; q=0.01',
-        'accept-language': 'en-GB,en;q=0.9',
-        'cache-control': 'no-cache',
-        'pragma': 'no-cache',
-        'priority': 'u=0, i',  # Keep priority header if observed
-        'referer': 'https://www.jiomart.com/',
-        'sec-fetch-dest': 'empty',
-        'sec-fetch-mode': 'cors',
-        'sec-fetch-site': 'same-origin',
-        'sec-gpc': '1',
-        'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
-        'x-requested-with': 'XMLHttpRequest'
-        # NOTE: Cookies are omitted initially. Add if required based on testing.
-    }
-    logging.info(f"[JioMart Mapping] Calling API: {mapping_url}")
+    mapping_url = f"{JIOMART_MAPPING_URL}{pincode}"
+    logging.info("[JioMart Mapping] Calling API: %s", mapping_url)
     try:
-        response = requests.get(
-            mapping_url, headers=headers, timeout=REQUEST_TIMEOUT)
+        response = SESSION.get(
+            mapping_url, headers=_JIOMART_MAPPING_HEADERS, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
 
-        # Save the response for debugging
-        with open("jiomart_mapping_response.json", "w") as f:
-            json.dump(data, f, indent=4)
-        logging.info(
-            f"[JioMart Mapping] API response saved to jiomart_mapping_response.json")
         # Basic validation of response structure
         if "region_codes" in data and "store_codes" in data:
             logging.info(
-                f"[JioMart Mapping] Successfully received codes for pincode {pincode}.")
+                "[JioMart Mapping] Successfully received codes for pincode %s.", pincode)
             return data
         else:
-            logging.warning(
-                f"[JioMart Mapping] Received unexpected JSON structure for pincode {pincode}: {str(data)[:200]}...")
+            # Rendering the whole payload is costly, so only do it if it will be emitted
+            if logging.getLogger().isEnabledFor(logging.WARNING):
+                logging.warning(
+                    "[JioMart Mapping] Received unexpected JSON structure for pincode %s: %s...", pincode, str(data)[:200])
             return None
     except requests.exceptions.HTTPError as e:
         # Specifically check for 404 which might mean pincode not serviceable/found
         if e.response.status_code == 404:
             logging.warning(
-                f"[JioMart Mapping] Pincode {pincode} not found or not serviceable (404 Error).")
+                "[JioMart Mapping] Pincode %s not found or not serviceable (404 Error).", pincode)
+            return _NOT_SERVICEABLE
         else:
             logging.error(
-                f"[JioMart Mapping] API returned HTTP error: {e.response.status_code} {e.response.text[:200]}...")
-        return None
+                "[JioMart Mapping] API returned HTTP error: %s %s...", e.response.status_code, e.response.text[:200])
+        raise
     except requests.exceptions.RequestException as e:
-        logging.error(f"[JioMart Mapping] API call failed: {e}")
-        return None
-    except json.JSONDecodeError:
+        logging.error("[JioMart Mapping] API call failed: %s", e)
+        raise
+    except orjson.JSONDecodeError:
         logging.error(
-            f"[JioMart Mapping] Failed to decode JSON response for pincode {pincode}.")
-        return None
+            "[JioMart Mapping] Failed to decode JSON response for pincode %s.", pincode)
+        raise
     except Exception as e:
-        logging.error(f"[JioMart Mapping] An unexpected error occurred: {e}")
-        return None
-
-# --- Updated JioMart Search Function ---
+        logging.error("[JioMart Mapping] An unexpected error occurred: %s", e)
+        raise
 
 
-def search_jiomart_products(query, pincode):
+def get_jiomart_inventory_codes(pincode):
     """
-    Searches JioMart using Algolia, dynamic filters, and parses the
-    confirmed nested price structure.
+    Returns the store/region codes for a pincode, served from
+    INVENTORY_CODES_CACHE when available. Successful lookups are cached
+    for an hour and 404s (unserviceable pincodes) for five minutes. Fetch
+    errors propagate uncached, so they are retried on the next search.
     """
-    jiomart_results = []
-    jiomart_base_url = "https://www.jiomart.com"
-    algolia_app_id = "3YP0HP3WSH"
-    algolia_api_key = "aace3f18430a49e185d2c1111602e4b1"
-    index_name = "prod_mart_master_vertical"
-    algolia_url = f"https://{algolia_app_id}-dsn.algolia.net/1/indexes/*/queries"
+    with _INVENTORY_CODES_LOCK:
+        cached = INVENTORY_CODES_CACHE.get(pincode)
+        unserviceable = pincode in UNSERVICEABLE_PINCODES_CACHE
+    if unserviceable:
+        logging.info(
+            "[JioMart Mapping] Pincode %s recently reported as not serviceable. Skipping lookup.", pincode)
+        return None
+    if cached is not None:
+        logging.info(
+            "[JioMart Mapping] Using cached codes for pincode %s.", pincode)
+        return cached
+
+    data = _fetch_jiomart_inventory_codes(pincode)
+    if data is _NOT_SERVICEABLE:
+        with _INVENTORY_CODES_LOCK:
+            UNSERVICEABLE_PINCODES_CACHE[pincode] = True
+        return None
+    if data is not None:
+        with _INVENTORY_CODES_LOCK:
+            INVENTORY_CODES_CACHE[pincode] = data
+    return data
 
+def _build_filters_for_pincode(pincode):
+    """
+    Returns (analytics params, filter params, frozenset of store codes)
+    for a pincode, or None if the codes are unavailable. Both params
+    strings are already URL-encoded: the first holds the pincode's
+    analyticsTags, the second the facetFilters, filters and static params,
+    and is shared between pincodes with the same stores. A search only
+    has to prepend "query=...". The result is memoized in
+    FILTERS_CACHE for as long as the pincode's inventory codes stay cached.
+    """
     # --- Step 1: Get Location Codes ---
     location_data = get_jiomart_inventory_codes(pincode)
     if not location_data:
         logging.error(
-            f"[JioMart] Failed to get inventory codes for pincode {pincode}. Aborting search.")
-        return jiomart_results
+            "[JioMart] Failed to get inventory codes for pincode %s. Aborting search.", pincode)
+        return None
+
+    with _FILTERS_LOCK:
+        cached = FILTERS_CACHE.get(pincode)
+    # Reuse only if built from the current inventory entry (not a since-expired one)
+    if cached is not None and cached[0] is location_data:
+        return cached[1]
 
     # --- Step 2: Build Dynamic Filters ---
     try:
-        # Extract unique region codes (used in available_stores filter)
-        all_region_codes = set(code for codes in location_data.get(
-            "region_codes", {}).values() for code in codes)
-        available_stores_filter = build_algolia_or_filter(
-            "available_stores", list(all_region_codes))
-
-        # Extract unique store codes (used to find relevant price AND in inventory filter)
-        all_store_codes = set(code for codes in location_data.get(
-            "store_codes", {}).values() for code in codes)
-
-        # Build the combined inventory filter clause
-        inventory_clauses = ["inventory_stores:ALL", "inventory_stores_3p:ALL"]
-        inventory_clauses.extend(
-            [f"inventory_stores:{code}" for code in all_store_codes])
-        inventory_clauses.extend(
-            [f"inventory_stores_3p:{code}" for code in all_store_codes])
-        inventory_filter = f"({' OR '.join(inventory_clauses)})"
-
-        if not available_stores_filter or not all_store_codes:
+        # Flatten and deduplicate the code lists in C via chain.from_iterable
+        all_region_codes = frozenset(chain.from_iterable(
+            location_data.get("region_codes", {}).values()))  # used in available_stores filter
+        # Used to find the relevant price AND in the inventory filter
+        all_store_codes = frozenset(chain.from_iterable(
+            location_data.get("store_codes", {}).values()))
+
+        if not all_region_codes or not all_store_codes:
             logging.warning(
-                f"[JioMart] Could not extract sufficient codes for {pincode}. Filters might be incomplete.")
-            return jiomart_results  # Abort
-
-        base_filters = "(mart_availability:JIO OR mart_availability:JIO_WA)"
-        exclusions = "(NOT vertical_code:ALCOHOL) AND (NOT vertical_code:LOCALSHOPS)"
-        final_filters = f"{base_filters} AND {available_stores_filter} AND {exclusions} AND {inventory_filter}"
+                "[JioMart] Could not extract sufficient codes for %s. Filters might be incomplete.", pincode)
+            return None  # Abort
+
+        codes_key = (all_region_codes, all_store_codes)
+        with _FILTERS_LOCK:
+            shared = FACET_FILTERS_CACHE.get(codes_key)
+        if shared is None:
+            # Disjunctive facet groups, serialized straight to JSON
+            facet_filters = orjson.dumps((
+                _MART_AVAILABILITY_FACETS,
+                list(map("available_stores:{}".format, all_region_codes)),
+                list(chain(
+                    ("inventory_stores:ALL", "inventory_stores_3p:ALL"),
+                    map("inventory_stores:{}".format, all_store_codes),
+                    map("inventory_stores_3p:{}".format, all_store_codes))),
+            )).decode()
+            shared = (
+                "&facetFilters=" + _quote(facet_filters)
+                + "&filters=" + _EXCLUSIONS_ENC
+                + "&" + _STATIC_PARAMS_ENC,
+                all_store_codes)
+            with _FILTERS_LOCK:
+                FACET_FILTERS_CACHE[codes_key] = shared
+        filter_params, all_store_codes = shared
 
     except Exception as e:
         logging.error(
-            f"[JioMart] Error building Algolia filters from location data: {e}")
-        return jiomart_results
+            "[JioMart] Error building Algolia filters from location data: %s", e)
+        return None
 
-    # --- Step 3: Construct Algolia Request ---
-    attributes_to_get = [  # Request fields based on sample response and previous findings
-        "product_code", "display_name", "brand", "category_level.level4",
-        "buybox_mrp", "vertical_code", "image_path", "url_path", "objectID"
-        # Note: variant_text/weight_string seem missing from actual data, even if requested
-    ]
-    params = {
-        "query": query, "page": 0, "hitsPerPage": 20,
-        "analyticsTags": json.dumps(["web", pincode, "Query Search"]),
-        "filters": final_filters,
-        "attributesToRetrieve": json.dumps(attributes_to_get),
-        "attributesToHighlight": '[]', "clickAnalytics": "false",
-        "userToken": "backend-aggregator-user-004"
-    }
-    encoded_params = urllib.parse.urlencode(params)
-    request_body = {"requests": [
-        {"indexName": index_name, "params": encoded_params}]}
-    headers = {
-        'Accept': 'application/json', 'Content-Type': 'application/json',
-        'x-algolia-application-id': algolia_app_id, 'x-algolia-api-key': algolia_api_key,
-        'Origin': 'https://www.jiomart.com', 'Referer': 'https://www.jiomart.com/',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'
-    }
-
-    # --- Step 4: Call Algolia API ---
-    logging.info(f"[JioMart] Calling Algolia API...")
-    try:
-        response = requests.post(
-            algolia_url, headers=headers, json=request_body, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        data = response.json()
+    analytics_params = "&analyticsTags=" + _quote(
+        orjson.dumps(["web", pincode, "Query Search"]).decode())
+    result = (analytics_params, filter_params, all_store_codes)
+    with _FILTERS_LOCK:
+        FILTERS_CACHE[pincode] = (location_data, result)
+    return result
+
+def _to_float(value):
+    """float() for numbers and numeric strings; None for anything else."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
 
-        # --- Step 5: Parse and Normalize Response ---
-        if not data or "results" not in data or not data["results"]:
+
+def _available_price(price_info):
+    """
+    Returns (mrp, selling price) for an available buybox_mrp entry, or
+    None if it is unavailable, malformed or lacks a usable selling price.
+    """
+    if not isinstance(price_info, dict) or not price_info.get("available"):
+        return None
+    selling_price = _to_float(price_info.get("price"))
+    if selling_price is None:
+        return None
+    return _to_float(price_info.get("mrp")), selling_price
+
+# --- Updated JioMart Search Function ---
+
+
+@dataclass(slots=True)
+class JiomartProduct:
+    """
+    A normalized JioMart hit. Slotted to keep the per-product footprint
+    small; orjson serializes it natively with the same keys as the other
+    platforms' product dicts.
+    """
+    name: str
+    mrp: Optional[float]
+    selling_price: float
+    image: Optional[str]
+    variant: Optional[str]
+    barcode: str
+    deeplink: str
+
+
+def _normalize_hits(hits, all_store_codes):
+    """
+    Normalizes Algolia hits into JiomartProducts, picking the price from the
+    pincode's store codes and falling back to any available buybox price.
+    """
+    jiomart_results = []
+
+    # No per-hit try/except: malformed values are screened inline (non-string
+    # name/paths count as missing, prices go through _available_price), so one
+    # bad hit can't raise and discard the rest of the response
+    for hit in hits:
+        if not isinstance(hit, dict):
+            continue
+        get = hit.get  # Bound once per hit
+        name = get("display_name")
+        if not isinstance(name, str):
+            name = None
+        buybox_mrp_data = get("buybox_mrp")  # Get the price object
+        if not isinstance(buybox_mrp_data, dict):
+            buybox_mrp_data = _EMPTY
+
+        # Find the correct (mrp, selling price) based on relevant store codes
+        prices = None
+
+        # Prioritize specific store codes returned by the mapping API.
+        # Intersecting walks the (small) buybox keys instead of every store code.
+        for store_code in all_store_codes.intersection(buybox_mrp_data):
+            prices = _available_price(buybox_mrp_data[store_code])
+            if prices is not None:
+                break  # Use the first relevant store's price
+
+        # Fallback: If no specific store code matched, try broader region codes present in buybox_mrp keys?
+        # Or just use the first available price if any? Let's try using the first available price.
+        if prices is None:
+            for key, price_info in buybox_mrp_data.items():
+                prices = _available_price(price_info)
+                if prices is not None:
+                    logging.debug(
+                        "[JioMart] Using fallback price from key '%s' for %s", key, get('objectID'))
+                    break
+
+        variant = None  # Variant info seems missing
+        url_path = get("url_path")
+        deeplink = f"{JIOMART_BASE_URL}{url_path}" if url_path and isinstance(url_path, str) else JIOMART_BASE_URL
+
+        image_relative_url = get("image_path")
+        image_url = _JIOMART_IMAGE_URL % image_relative_url if image_relative_url and isinstance(image_relative_url, str) else None
+        # Using product_code as barcode
+        barcode = get("product_code")
+
+        if name and prices is not None:  # Check if we found a name and a selling price
+            mrp_num, selling_price_num = prices
+            normalized_product = JiomartProduct(
+                name=name,
+                mrp=mrp_num,  # Already float or None
+                selling_price=selling_price_num,  # Already float
+                image=image_url,
+                variant=variant,  # Likely None
+                # Convert to string
+                barcode=str(barcode) if barcode else "",
+                deeplink=deeplink
+            )
+            jiomart_results.append(normalized_product)
+        else:
             logging.warning(
-                "[JioMart] Algolia response missing 'results' array.")
+                "[JioMart] Skipping hit %s due to missing name or price data in buybox_mrp for relevant stores.", get('objectID'))
+
+    return jiomart_results
+
+
+def _algolia_multi_query(queries, analytics_params, filter_params):
+    """
+    Sends every query in one POST to Algolia's multi-query endpoint and
+    returns the "results" list (one entry per query, in order), or None
+    if the response has none. Request errors propagate to the caller.
+    """
+    # Only the query is encoded per request; the rest is pre-encoded per pincode
+    request_body = {"requests": [
+        {"indexName": ALGOLIA_INDEX_NAME, "params": "query=" + _quote(query) + analytics_params + filter_params}
+        for query in queries]}
+
+    response = ALGOLIA_CLIENT.post(ALGOLIA_URL, content=orjson.dumps(request_body))
+    response.raise_for_status()
+    data = orjson.loads(response.content)
+
+    # Debugging aid only; kept off the request path unless explicitly enabled
+    if DUMP_RESPONSES:
+        with open("algolia_response.json", "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+
+    if not data or "results" not in data or not data["results"]:
+        logging.warning(
+            "[JioMart] Algolia response missing 'results' array.")
+        return None
+    return data["results"]
+
+
+def search_jiomart_products(query, pincode):
+    """
+    Searches JioMart using Algolia, dynamic filters, and parses the
+    confirmed nested price structure. An unserviceable pincode yields an
+    empty list; upstream failures are logged and re-raised.
+    """
+    jiomart_results = []
+
+    # --- Steps 1 & 2: Get Location Codes and Build Dynamic Filters ---
+    pincode_filters = _build_filters_for_pincode(pincode)
+    if not pincode_filters:
+        return jiomart_results
+    analytics_params, filter_params, all_store_codes = pincode_filters
+
+    # --- Steps 3 & 4: Construct Request and Call Algolia API ---
+    logging.info("[JioMart] Calling Algolia API...")
+    try:
+        results = _algolia_multi_query((query,), analytics_params, filter_params)
+        if not results:
             return jiomart_results
 
-        hits = data["results"][0].get("hits", [])
-        logging.info(f"[JioMart] Algolia returned {len(hits)} hits.")
-
-        for hit in hits:
-            try:
-                name = hit.get("display_name")
-                buybox_mrp_data = hit.get(
-                    "buybox_mrp", {})  # Get the price object
-
-                # Find the correct price/mrp based on relevant store codes
-                mrp_num = None
-                selling_price_num = None
-                found_price = False
-
-                # Prioritize specific store codes returned by the mapping API
-                for store_code in all_store_codes:
-                    if store_code in buybox_mrp_data:
-                        price_info = buybox_mrp_data[store_code]
-                        # Check if available for this store
-                        if price_info and price_info.get("available"):
-                            mrp_num = float(price_info.get("mrp")) if price_info.get(
-                                "mrp") is not None else None
-                            selling_price_num = float(price_info.get("price")) if price_info.get(
-                                "price") is not None else None
-                            if selling_price_num is not None:  # Found a valid price
-                                found_price = True
-                                break  # Use the first relevant store's price
-
-                # Fallback: If no specific store code matched, try broader region codes present in buybox_mrp keys?
-                # Or just use the first available price if any? Let's try using the first available price.
-                if not found_price and buybox_mrp_data:
-                    for key, price_info in buybox_mrp_data.items():
-                        if price_info and price_info.get("available"):
-                            mrp_num = float(price_info.get("mrp")) if price_info.get(
-                                "mrp") is not None else None
-                            selling_price_num = float(price_info.get("price")) if price_info.get(
-                                "price") is not None else None
-                            if selling_price_num is not None:
-                                logging.debug(
-                                    f"[JioMart] Using fallback price from key '{key}' for {hit.get('objectID')}")
-                                found_price = True
-                                break
-
-                variant = None  # Variant info seems missing
-                url_path = hit.get("url_path")
-                deeplink = f"{jiomart_base_url}{url_path}" if url_path else jiomart_base_url
-
-                image_relative_url = hit.get("image_path")
-                image_url = f"{jiomart_base_url}/images/product/original/{image_relative_url}?im=Resize=(150,150)" if image_relative_url else None
-                # Using product_code as barcode
-                barcode = hit.get("product_code")
-
-                if name and selling_price_num is not None:  # Check if we found a name and a selling price
-                    normalized_product = {
-                        "name": name,
-                        "mrp": mrp_num,  # Already float or None
-                        "selling_price": selling_price_num,  # Already float
-                        "image": image_url,
-                        "variant": variant,  # Likely None
-                        # Convert to string
-                        "barcode": str(barcode) if barcode else "",
-                        "deeplink": deeplink
-                    }
-                    jiomart_results.append(normalized_product)
-                else:
-                    logging.warning(
-                        f"[JioMart] Skipping hit {hit.get('objectID')} due to missing name or price data in buybox_mrp for relevant stores.")
-
-            except (ValueError, TypeError) as e:
-                logging.error(
-                    f"[JioMart] Error converting data type for hit {hit.get('objectID')}: {e}")
-                continue
-            except Exception as e:
-                logging.error(
-                    f"[JioMart] Error parsing one Algolia hit {hit.get('objectID')}: {e}")
-                continue
+        # --- Step 5: Parse and Normalize Response ---
+        hits = results[0].get("hits", [])
+        logging.info("[JioMart] Algolia returned %d hits.", len(hits))
+        jiomart_results = _normalize_hits(hits, all_store_codes)
 
         logging.info(
-            f"[JioMart] Successfully normalized {len(jiomart_results)} products.")
+            "[JioMart] Successfully normalized %d products.", len(jiomart_results))
 
     # (Keep existing exception handling)
-    except requests.exceptions.RequestException as e:
-        logging.error(f"[JioMart] Algolia API call failed: {e}")
+    except httpx.HTTPError as e:
+        logging.error("[JioMart] Algolia API call failed: %s", e)
+        raise
     # ... other except blocks
     except Exception as e:
         logging.error(
-            f"[JioMart] An unexpected error occurred during JioMart search: {e}")
+            "[JioMart] An unexpected error occurred during JioMart search: %s", e)
+        raise
 
     return jiomart_results
 
 
+def search_jiomart_products_batch(queries, pincode):
+    """
+    Searches JioMart for several queries at one pincode with a single
+    Algolia multi-query POST. Returns a dict of query -> normalized
+    products; upstream failures are logged and re-raised.
+    """
+    unique_queries = list(dict.fromkeys(queries))
+    batch_results = {query: [] for query in unique_queries}
+    if not unique_queries:
+        return batch_results
+
+    pincode_filters = _build_filters_for_pincode(pincode)
+    if not pincode_filters:
+        return batch_results
+    analytics_params, filter_params, all_store_codes = pincode_filters
+
+    logging.info(
+        "[JioMart] Calling Algolia API with %d queries...", len(unique_queries))
+    try:
+        results = _algolia_multi_query(unique_queries, analytics_params, filter_params)
+        if not results:
+            return batch_results
+
+        # Results come back in request order
+        for query, result in zip(unique_queries, results):
+            if isinstance(result, dict):
+                batch_results[query] = _normalize_hits(
+                    result.get("hits", []), all_store_codes)
+
+    except httpx.HTTPError as e:
+        logging.error("[JioMart] Algolia batch API call failed: %s", e)
+        raise
+    except Exception as e:
+        logging.error(
+            "[JioMart] An unexpected error occurred during JioMart batch search: %s", e)
+        raise
+
+    return batch_results
+
+# --- Concurrent Multi-Query Search ---
+
+
+def search_many(queries, pincode, max_workers=8):
+    """
+    Searches JioMart for several queries at one pincode concurrently,
+    sharing the pooled SESSION and ALGOLIA_CLIENT connections. Returns a dict of
+    query -> normalized products; raises if any of the searches fails.
+    """
+    unique_queries = list(dict.fromkeys(queries))
+    if not unique_queries:
+        return {}
+    # Resolve the pincode's filters once up front so the workers all hit the cache
+    _build_filters_for_pincode(pincode)
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(unique_queries))) as executor:
+        results = executor.map(
+            lambda query: search_jiomart_products(query, pincode), unique_queries)
+        return dict(zip(unique_queries, results))
+
+
 # if __name__ == "__main__":
 #     # Example usage
 #     pincode = "500049"  # Replace with a valid pincode
 #     query = "milk"  # Replace with a search term
 #     results = search_jiomart_products(query, pincode)
-#     print(json.dumps(results, indent=2))
+#     print(orjson.dumps(results, option=orjson.OPT_INDENT_2).decode())
@@ -0,0 +1,54 @@
+"""
+Per-item normalization helpers for the platform searches.
+
+Kept free of Flask/requests imports and fully annotated so the module can
+be compiled with mypyc (`mypyc normalize.py`); the compiled extension is
+picked up automatically in place of this file when present.
+"""
+import logging
+from typing import Optional
+
+# Base URL for DMart images, %-formatted per SKU with (image key, image code)
+DMART_IMAGE_URL = "https://cdn.dmart.in/images/products/%s_%s_P.jpg"
+
+
+def normalize_dmart_sku(sku: dict, parent_name: str, product_url: str) -> Optional[dict]:
+    """
+    Normalizes one DMart SKU to the common product structure.
+    Returns None for non-buyable, out-of-stock or unpriced SKUs.
+    """
+    get = sku.get  # Pre-bound alias: one attribute lookup per SKU
+    if get("buyable") != "true" or get("invType") == "OOS":
+        return None  # Skip non-buyable or OOS items
+
+    mrp_str = get("priceMRP")
+    selling_price_str = get("priceSALE")
+    if not mrp_str or not selling_price_str:
+        return None  # Cheap pre-check instead of a per-SKU try/except
+    try:
+        mrp = float(mrp_str)
+        selling_price = float(selling_price_str)
+    except (ValueError, TypeError) as e:
+        logging.error("[DMart] Error converting price for SKU %s: %s", get('skuUniqueID'), e)
+        return None
+
+    # --- Corrected Image URL Logic ---
+    img_code = get("imgCode")
+    image_key = get("productImageKey") or get("imageKey")  # imageKey is the fallback
+    image_url: Optional[str] = None
+    if image_key and img_code:
+        image_url = DMART_IMAGE_URL % (image_key, img_code)
+    else:
+        logging.warning("[DMart] Missing productImageKey or imgCode for SKU %s. Cannot construct image URL.", get('skuUniqueID'))
+    # --- End Corrected Image URL Logic ---
+
+    # Normalize data to target structure
+    return {
+        "name": parent_name,
+        "mrp": mrp,
+        "selling_price": selling_price,
+        "image": image_url,  # Use the constructed URL
+        "variant": get("variantTextValue"),
+        "barcode": get("articleNumber") or "",  # articleNumber as potential barcode/EAN
+        "deeplink": product_url  # Ensure string, default empty
+    }
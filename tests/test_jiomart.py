@@ -0,0 +1,46 @@
+"""
+JioMart hit normalization with malformed Algolia hits.
+
+Run with `python -m unittest` from the repo root.
+"""
+import unittest
+
+import jiomart
+
+STORE_CODES = frozenset({"S1"})
+GOOD_HIT = {
+    "objectID": "1", "display_name": "Milk", "url_path": "/p/milk", "image_path": "milk.jpg",
+    "product_code": 123, "buybox_mrp": {"S1": {"available": True, "mrp": "30", "price": "28"}},
+}
+
+
+class NormalizeHitsTest(unittest.TestCase):
+
+    def test_good_hit(self):
+        (product,) = jiomart._normalize_hits([GOOD_HIT], STORE_CODES)
+        self.assertEqual(product.name, "Milk")
+        self.assertEqual((product.mrp, product.selling_price), (30.0, 28.0))
+        self.assertEqual(product.deeplink, "https://www.jiomart.com/p/milk")
+        self.assertEqual(product.barcode, "123")
+
+    def test_non_string_paths_count_as_missing(self):
+        bad_hit = dict(GOOD_HIT, objectID="2", url_path=123, image_path=["x"])
+        good, bad = jiomart._normalize_hits([GOOD_HIT, bad_hit], STORE_CODES)
+        self.assertEqual(good.deeplink, "https://www.jiomart.com/p/milk")
+        self.assertEqual(bad.deeplink, jiomart.JIOMART_BASE_URL)
+        self.assertIsNone(bad.image)
+
+    def test_malformed_hits_are_skipped_without_losing_the_rest(self):
+        hits = [
+            "not a dict",
+            dict(GOOD_HIT, display_name=42),
+            dict(GOOD_HIT, buybox_mrp=None),
+            dict(GOOD_HIT, buybox_mrp={"S1": {"available": True, "mrp": "abc", "price": "x"}}),
+            GOOD_HIT,
+        ]
+        products = jiomart._normalize_hits(hits, STORE_CODES)
+        self.assertEqual([product.name for product in products], ["Milk"])
+
+
+if __name__ == "__main__":
+    unittest.main()
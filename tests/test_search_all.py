@@ -0,0 +1,78 @@
+"""
+/search_all caching when upstream calls fail.
+
+Upstream HTTP is mocked at the SESSION.get level, so the platform search
+functions run for real. Run with `python -m unittest` from the repo root.
+"""
+import unittest
+from unittest import mock
+
+import orjson
+import requests
+
+import aggregator_api
+import jiomart
+
+DMART_PRODUCTS = {"products": [{
+    "name": "Milk", "targetUrl": "/milk",
+    "sKUs": [{"buyable": "true", "priceMRP": "30", "priceSALE": "28",
+              "imgCode": "1", "productImageKey": "k"}],
+}]}
+
+
+def _response(url, status_code, body=b"{}"):
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response._content = body
+    return response
+
+
+def _fake_get(jiomart_status):
+    """SESSION.get stand-in: DMart answers, 9minutes.in is unreachable, JioMart mapping returns jiomart_status."""
+    def get(url, **kwargs):
+        if "dmart.in" in url:
+            return _response(url, 200, orjson.dumps(DMART_PRODUCTS))
+        if "9minutes.in" in url:
+            raise requests.exceptions.ConnectionError("9minutes.in unreachable")
+        return _response(url, jiomart_status)
+    return get
+
+
+class SearchAllCachingTest(unittest.TestCase):
+
+    def setUp(self):
+        for cache in (aggregator_api.RESPONSE_CACHE, jiomart.INVENTORY_CODES_CACHE,
+                      jiomart.UNSERVICEABLE_PINCODES_CACHE, jiomart.FILTERS_CACHE):
+            cache.clear()
+        self.client = aggregator_api.app.test_client()
+
+    def _search(self, pincode, stream, jiomart_status):
+        with mock.patch.object(aggregator_api.SESSION, "get", _fake_get(jiomart_status)), \
+                mock.patch.object(jiomart.SESSION, "get", _fake_get(jiomart_status)):
+            response = self.client.get(
+                "/search_all", query_string={"query": "milk", "pincode": pincode, "stream": stream})
+            return response, orjson.loads(response.get_data())
+
+    def test_failed_upstreams_are_not_cached(self):
+        for stream in ("0", "1"):
+            with self.subTest(stream=stream):
+                response, body = self._search("500032", stream, jiomart_status=503)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(body["dmart_products"]), 1)
+                self.assertEqual(body["instamart_products"], [])
+                self.assertEqual(body["jiomart_products"], [])
+                self.assertIsNone(response.headers.get("ETag"))
+                self.assertEqual(len(aggregator_api.RESPONSE_CACHE), 0)
+
+    def test_unmapped_pincode_is_a_valid_empty_answer(self):
+        # 400076 has a DMart store but no 9minutes.in location, and JioMart reports it unserviceable
+        response, body = self._search("400076", "0", jiomart_status=404)
+        self.assertEqual(len(body["dmart_products"]), 1)
+        self.assertEqual(body["jiomart_products"], [])
+        self.assertIsNotNone(response.headers.get("ETag"))
+        self.assertEqual(len(aggregator_api.RESPONSE_CACHE), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()